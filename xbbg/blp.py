@@ -1,11 +1,15 @@
 import pandas as pd
+import pyarrow.parquet as pq
+
+import os
+import gc
 
 from functools import partial
-from itertools import product
+from itertools import product, count
 from contextlib import contextmanager
 
 from xbbg import __version__, const, pipeline
-from xbbg.io import logs, files, storage
+from xbbg.io import logs, files, storage, cached
 from xbbg.core import utils, conn, process
 from xbbg.core.conn import connect
 
@@ -26,6 +30,10 @@ __all__ = [
     'turnover',
 ]
 
+_PQ_READ_KW_ = dict(pre_buffer=True, use_threads=True)
+_GC_EVERY_ = 16
+_BATCH_CNT_ = count(1)
+
 
 def bdp(tickers, flds, **kwargs) -> pd.DataFrame:
     """
@@ -34,26 +42,62 @@ def bdp(tickers, flds, **kwargs) -> pd.DataFrame:
     Args:
         tickers: tickers
         flds: fields to query
-        **kwargs: Bloomberg overrides
+        **kwargs:
+            cache: whether to load / save query results under BBG_ROOT (default False)
+            cache_days: days before cached results expire (default 10)
+            other Bloomberg overrides
 
     Returns:
         pd.DataFrame
+
+    Examples:
+        >>> import shutil, tempfile
+        >>> bbg_root = os.environ.get('BBG_ROOT', '')
+        >>> os.environ['BBG_ROOT'] = tempfile.mkdtemp()
+        >>> sample = pd.DataFrame(
+        ...     [['AAPL US Equity', 'Crncy', 'USD']], columns=['ticker', 'field', 'value']
+        ... )
+        >>> cached.update_bdp_bds_cache(sample)
+        >>> bdp(pd.Index(['AAPL US Equity']), pd.Index(['Crncy']), cache=True)
+                       crncy
+        AAPL US Equity   USD
+        >>> shutil.rmtree(os.environ['BBG_ROOT'])
+        >>> os.environ['BBG_ROOT'] = bbg_root
     """
     logger = logs.get_logger(bdp, **kwargs)
 
-    if isinstance(tickers, str): tickers = [tickers]
-    if isinstance(flds, str): flds = [flds]
+    tickers = utils.flatten(tickers)
+    flds = utils.flatten(flds)
 
-    request = process.create_request(
-        service='//blp/refdata',
-        request='ReferenceDataRequest',
-        **kwargs,
-    )
-    process.init_request(request=request, tickers=tickers, flds=flds, **kwargs)
-    logger.debug(f'Sending request to Bloomberg ...\n{request}')
-    conn.send_request(request=request, **kwargs)
+    if kwargs.get('cache', False):
+        to_qry = cached.bdp_bds_cache(tickers=tickers, flds=flds, **kwargs)
+    else:
+        to_qry = cached.ToQuery(tickers=tickers, flds=flds, cached_data=[])
+
+    res = pd.DataFrame()
+    if to_qry.tickers and to_qry.flds:
+        request = process.create_request(
+            service='//blp/refdata',
+            request='ReferenceDataRequest',
+            **kwargs,
+        )
+        process.init_request(
+            request=request, tickers=to_qry.tickers, flds=to_qry.flds, **kwargs
+        )
+        logger.debug('Sending request to Bloomberg ...\n%s', request)
+        conn.send_request(request=request, **kwargs)
 
-    res = pd.DataFrame(process.rec_events(func=process.process_ref, **kwargs))
+        res = pd.DataFrame(process.rec_events(func=process.process_ref, **kwargs))
+        if kwargs.get('cache', False):
+            cached.update_bdp_bds_cache(data=res, **kwargs)
+
+    if to_qry.cached_data:
+        if not res.empty: to_qry.cached_data.append(res)
+        res = (
+            pd.concat(to_qry.cached_data, sort=False)
+            .drop_duplicates(subset=['ticker', 'field'], keep='last')
+            .reset_index(drop=True)
+        )
     if kwargs.get('raw', False): return res
     if res.empty or any(fld not in res for fld in ['ticker', 'field']):
         return pd.DataFrame()
@@ -86,7 +130,10 @@ def bds(tickers, flds, use_port=False, **kwargs) -> pd.DataFrame:
 
     part = partial(_bds_, fld=flds, logger=logger, use_port=use_port, **kwargs)
     if isinstance(tickers, str): tickers = [tickers]
-    return pd.DataFrame(pd.concat(map(part, tickers), sort=False))
+    res = list(map(part, tickers))
+    if not res: return pd.DataFrame()
+    if len(res) == 1: return res[0]
+    return pd.DataFrame(pd.concat(res, sort=False))
 
 
 def _bds_(
@@ -101,7 +148,7 @@ def _bds_(
     """
     if 'has_date' not in kwargs: kwargs['has_date'] = True
     data_file = storage.ref_file(ticker=ticker, fld=fld, ext='pkl', **kwargs)
-    if files.exists(data_file):
+    if os.path.isfile(data_file):
         logger.debug(f'Loading Bloomberg data from: {data_file}')
         return pd.DataFrame(pd.read_pickle(data_file))
 
@@ -111,7 +158,7 @@ def _bds_(
         **kwargs,
     )
     process.init_request(request=request, tickers=ticker, flds=fld, **kwargs)
-    logger.debug(f'Sending request to Bloomberg ...\n{request}')
+    logger.debug('Sending request to Bloomberg ...\n%s', request)
     conn.send_request(request=request, **kwargs)
 
     res = pd.DataFrame(process.rec_events(func=process.process_ref, **kwargs))
@@ -173,7 +220,7 @@ def bdh(
         request=request, tickers=tickers, flds=flds,
         start_date=s_dt, end_date=e_dt, adjust=adjust, **kwargs
     )
-    logger.debug(f'Sending request to Bloomberg ...\n{request}')
+    logger.debug('Sending request to Bloomberg ...\n%s', request)
     conn.send_request(request=request, **kwargs)
 
     res = pd.DataFrame(process.rec_events(process.process_hist, **kwargs))
@@ -219,9 +266,10 @@ def bdib(ticker: str, dt, session='allday', typ='TRADE', **kwargs) -> pd.DataFra
 
     ss_rng = process.time_range(dt=dt, ticker=ticker, session=session, tz=ex_info.tz, **kwargs)
     data_file = storage.bar_file(ticker=ticker, dt=dt, typ=typ)
-    if files.exists(data_file) and kwargs.get('cache', True) and (not kwargs.get('reload', False)):
+    if os.path.isfile(data_file) and kwargs.get('cache', True) and (not kwargs.get('reload', False)):
         res = (
-            pd.read_parquet(data_file)
+            pq.read_table(data_file, **_PQ_READ_KW_)
+            .to_pandas(split_blocks=True, self_destruct=True)
             .pipe(pipeline.add_ticker, ticker=ticker)
             .loc[ss_rng[0]:ss_rng[1]]
         )
@@ -263,7 +311,7 @@ def bdib(ticker: str, dt, session='allday', typ='TRADE', **kwargs) -> pd.DataFra
         ],
         **kwargs,
     )
-    logger.debug(f'Sending request to Bloomberg ...\n{request}')
+    logger.debug('Sending request to Bloomberg ...\n%s', request)
     conn.send_request(request=request, **kwargs)
 
     res = pd.DataFrame(process.rec_events(func=process.process_bar, **kwargs))
@@ -284,7 +332,11 @@ def bdib(ticker: str, dt, session='allday', typ='TRADE', **kwargs) -> pd.DataFra
     if kwargs.get('cache', True):
         storage.save_intraday(data=data[ticker], ticker=ticker, dt=dt, typ=typ, **kwargs)
 
-    return data.loc[ss_rng[0]:ss_rng[1]]
+    # Drop the raw response before collecting garbage in long batch downloads
+    res = data.loc[ss_rng[0]:ss_rng[1]]
+    if kwargs.get('batch', False) and (next(_BATCH_CNT_) % _GC_EVERY_ == 0): gc.collect()
+
+    return res
 
 
 def bdtick(ticker, dt, session='allday', time_range=None, types=None, **kwargs) -> pd.DataFrame:
@@ -319,7 +371,6 @@ def bdtick(ticker, dt, session='allday', time_range=None, types=None, **kwargs)
                 f'{cur_dt} {time_range[1]}',
             ])
             .tz_localize(exch.tz)
-            .tz_convert(process.DEFAULT_TZ)
             .tz_convert('UTC')
         )
     else:
@@ -346,7 +397,7 @@ def bdtick(ticker, dt, session='allday', time_range=None, types=None, **kwargs)
         **kwargs,
     )
 
-    logger.debug(f'Sending request to Bloomberg ...\n{request}')
+    logger.debug('Sending request to Bloomberg ...\n%s', request)
     conn.send_request(request=request)
 
     res = pd.DataFrame(process.rec_events(func=process.process_bar, typ='t', **kwargs))
@@ -489,7 +540,7 @@ def beqs(screen, asof=None, typ='PRIVATE', group='General', **kwargs) -> pd.Data
         **kwargs,
     )
 
-    logger.debug(f'Sending request to Bloomberg ...\n{request}')
+    logger.debug('Sending request to Bloomberg ...\n%s', request)
     conn.send_request(request=request, **kwargs)
     res = pd.DataFrame(process.rec_events(func=process.process_ref, **kwargs))
     if res.empty:
@@ -615,8 +666,9 @@ def active_futures(ticker: str, dt, **kwargs) -> str:
     info = const.market_info(f'{prefix[:-1]}1 {asset}')
 
     f1, f2 = f'{prefix[:-1]}1 {asset}', f'{prefix[:-1]}2 {asset}'
-    fut_2 = fut_ticker(gen_ticker=f2, dt=dt, freq=info.get('freq', 'M'), **kwargs)
-    fut_1 = fut_ticker(gen_ticker=f1, dt=dt, freq=info.get('freq', 'M'), **kwargs)
+    fut_1, fut_2 = _fut_tickers_(
+        gen_tickers=[f1, f2], dt=dt, freq=info.get('freq', 'M'), **kwargs
+    )
 
     fut_tk = bdp(tickers=[fut_1, fut_2], flds='Last_Tradeable_Dt')
 
@@ -640,35 +692,59 @@ def fut_ticker(gen_ticker: str, dt, freq: str, **kwargs) -> str:
     Returns:
         str: exact futures ticker
     """
-    logger = logs.get_logger(fut_ticker, **kwargs)
-    dt = pd.Timestamp(dt)
-    t_info = gen_ticker.split()
-    pre_dt = pd.bdate_range(end='today', periods=1)[-1]
-    same_month = (pre_dt.month == dt.month) and (pre_dt.year == dt.year)
+    return _fut_tickers_(gen_tickers=[gen_ticker], dt=dt, freq=freq, **kwargs)[0]
 
-    asset = t_info[-1]
-    if asset in ['Index', 'Curncy', 'Comdty']:
-        ticker = ' '.join(t_info[:-1])
-        prefix, idx, postfix = ticker[:-1], int(ticker[-1]) - 1, asset
 
-    elif asset == 'Equity':
-        ticker = t_info[0]
-        prefix, idx, postfix = ticker[:-1], int(ticker[-1]) - 1, ' '.join(t_info[1:])
-
-    else:
-        logger.error(f'unkonwn asset type for ticker: {gen_ticker}')
-        return ''
+def _fut_tickers_(gen_tickers: list, dt, freq: str, **kwargs) -> list:
+    """
+    Get proper tickers from generic tickers with one query of expiry dates
 
-    month_ext = 4 if asset == 'Comdty' else 2
-    months = pd.date_range(start=dt, periods=max(idx + month_ext, 3), freq=freq)
-    logger.debug(f'pulling expiry dates for months: {months}')
+    Args:
+        gen_tickers: list of generic tickers
+        dt: date
+        freq: futures contract frequency
 
-    def to_fut(month):
-        return prefix + const.Futures[month.strftime('%b')] + \
-            month.strftime('%y')[-1 if same_month else -2:] + ' ' + postfix
+    Returns:
+        list: exact futures tickers - empty string if not found
+    """
+    logger = logs.get_logger(fut_ticker, **kwargs)
+    dt = pd.Timestamp(dt)
+    pre_dt = pd.bdate_range(end='today', periods=1)[-1]
+    same_month = (pre_dt.month == dt.month) and (pre_dt.year == dt.year)
 
-    fut = [to_fut(m) for m in months]
-    logger.debug(f'trying futures: {fut}')
+    res, chains = dict(), dict()
+    for gen_ticker in gen_tickers:
+        fut_kw = dict(gen_ticker=gen_ticker, dt=dt, freq=freq, same_month=same_month)
+        res[gen_ticker] = cached.fut_ticker_cache(**fut_kw)
+        if res[gen_ticker]: continue
+
+        t_info = gen_ticker.split()
+        asset = t_info[-1]
+        if asset in ['Index', 'Curncy', 'Comdty']:
+            ticker = ' '.join(t_info[:-1])
+            prefix, idx, postfix = ticker[:-1], int(ticker[-1]) - 1, asset
+
+        elif asset == 'Equity':
+            ticker = t_info[0]
+            prefix, idx, postfix = ticker[:-1], int(ticker[-1]) - 1, ' '.join(t_info[1:])
+
+        else:
+            logger.error(f'unkonwn asset type for ticker: {gen_ticker}')
+            continue
+
+        month_ext = 4 if asset == 'Comdty' else 2
+        months = pd.date_range(start=dt, periods=max(idx + month_ext, 3), freq=freq)
+        logger.debug('pulling expiry dates for months: %s', months)
+        yrs = [m.strftime('%y')[-1 if same_month else -2:] for m in months]
+        chains[gen_ticker] = (idx, [
+            f'{prefix}{const.Futures[m.strftime("%b")]}{yr} {postfix}'
+            for m, yr in zip(months, yrs)
+        ])
+
+    if not chains: return [res[gen_ticker] for gen_ticker in gen_tickers]
+
+    fut = list(dict.fromkeys(utils.flatten([chain for _, chain in chains.values()])))
+    logger.debug('trying futures: %s', fut)
     # noinspection PyBroadException
     try:
         fut_matu = bdp(tickers=fut, flds='last_tradeable_dt')
@@ -676,22 +752,30 @@ def fut_ticker(gen_ticker: str, dt, freq: str, **kwargs) -> str:
         logger.error(f'error downloading futures contracts (1st trial) {e1}:\n{fut}')
         # noinspection PyBroadException
         try:
-            fut = fut[:-1]
-            logger.debug(f'trying futures (2nd trial): {fut}')
+            fut = list(dict.fromkeys(utils.flatten([chain[:-1] for _, chain in chains.values()])))
+            logger.debug('trying futures (2nd trial): %s', fut)
             fut_matu = bdp(tickers=fut, flds='last_tradeable_dt')
         except Exception as e2:
             logger.error(f'error downloading futures contracts (2nd trial) {e2}:\n{fut}')
-            return ''
+            return [res[gen_ticker] for gen_ticker in gen_tickers]
 
     if 'last_tradeable_dt' not in fut_matu:
         logger.warning(f'no futures found for {fut}')
-        return ''
+        return [res[gen_ticker] for gen_ticker in gen_tickers]
 
     fut_matu.sort_values(by='last_tradeable_dt', ascending=True, inplace=True)
-    sub_fut = fut_matu[pd.DatetimeIndex(fut_matu.last_tradeable_dt) > dt]
-    logger.debug(f'futures full chain:\n{fut_matu.to_string()}')
-    logger.debug(f'getting index {idx} from:\n{sub_fut.to_string()}')
-    return sub_fut.index.values[idx]
+    logger.debug('futures full chain:\n%s', fut_matu)
+    not_expired = pd.to_datetime(fut_matu.last_tradeable_dt, cache=True).values > dt.to_datetime64()
+    for gen_ticker, (idx, chain) in chains.items():
+        sub_fut = fut_matu[not_expired & fut_matu.index.isin(chain)]
+        logger.debug('getting index %s from:\n%s', idx, sub_fut)
+        res[gen_ticker] = sub_fut.index.values[idx]
+        cached.update_fut_ticker(
+            ticker=res[gen_ticker], gen_ticker=gen_ticker,
+            dt=dt, freq=freq, same_month=same_month,
+        )
+
+    return [res[gen_ticker] for gen_ticker in gen_tickers]
 
 
 def adjust_ccy(data: pd.DataFrame, ccy: str = 'USD') -> pd.DataFrame:
@@ -1,5 +1,6 @@
 import pandas as pd
 
+from functools import lru_cache
 from collections import namedtuple
 from xbbg.core import timezone
 from xbbg.io import files, logs, param
@@ -227,6 +228,14 @@ def market_info(ticker: str) -> pd.Series:
         >>> pd.concat([market_info(_) for _ in incorrect_tickers])
         Series([], dtype: object)
     """
+    return _market_info_(ticker=ticker, cfg_stamp=param.config_stamp('assets')).copy()
+
+
+@lru_cache(maxsize=4096)
+def _market_info_(ticker: str, cfg_stamp: tuple) -> pd.Series:
+    """
+    Info for given ticker - cached until asset config files change
+    """
     t_info = ticker.split()
     exch_only = len(ticker) == 2
     if (not exch_only) and (t_info[-1] not in ['Equity', 'Comdty', 'Curncy', 'Index']):
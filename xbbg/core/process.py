@@ -1,15 +1,19 @@
 import pandas as pd
 import numpy as np
 
+import time
+
 import pytest
 try: import blpapi
 except ImportError: blpapi = pytest.importorskip('blpapi')
 
 from itertools import starmap
+from functools import lru_cache
 from collections import OrderedDict
 
 from xbbg import const
-from xbbg.core.timezone import DEFAULT_TZ
+from xbbg.io import param
+from xbbg.core.timezone import DEFAULT_TZ  # noqa: F401 - re-exported
 from xbbg.core import intervals, overrides, conn
 
 RESPONSE_ERROR = blpapi.Name("responseError")
@@ -20,6 +24,8 @@ BAR_DATA = blpapi.Name('barData')
 BAR_TICK = blpapi.Name('barTickData')
 TICK_DATA = blpapi.Name('tickData')
 
+ONE_DAY = pd.Timedelta(days=1)
+
 
 def create_request(
         service: str,
@@ -112,13 +118,40 @@ def time_range(dt, ticker, session='allday', tz='UTC', **kwargs) -> intervals.Se
         ticker: ticker
         session: market session defined in xbbg/markets/exch.yml
         tz: timezone
+        **kwargs: passed to `intervals.get_interval` and `const.exch_info` -
+            results are cached unless kwargs other than `ref` are given
 
     Returns:
         intervals.Session
     """
+    cur_dt = pd.Timestamp(dt).strftime('%Y-%m-%d')
+    if set(kwargs) - {'ref'}:
+        return _session_range_(cur_dt=cur_dt, ticker=ticker, session=session, tz=tz, **kwargs)
+
+    return _time_range_(
+        cur_dt=cur_dt,
+        ticker=ticker,
+        session=session,
+        tz=tz,
+        ref=kwargs.get('ref', ''),
+        cfg_stamp=(param.config_stamp('exch'), param.config_stamp('assets')),
+    )
+
+
+@lru_cache(maxsize=4096)
+def _time_range_(cur_dt: str, ticker, session, tz, ref, cfg_stamp) -> intervals.Session:
+    """
+    Time range of session - cached until exchange / asset config files change
+    """
+    return _session_range_(cur_dt=cur_dt, ticker=ticker, session=session, tz=tz, ref=ref)
+
+
+def _session_range_(cur_dt: str, ticker, session, tz, **kwargs) -> intervals.Session:
+    """
+    Time range of session for given date
+    """
     ss = intervals.get_interval(ticker=ticker, session=session, **kwargs)
     ex_info = const.exch_info(ticker=ticker, **kwargs)
-    cur_dt = pd.Timestamp(dt).strftime('%Y-%m-%d')
     time_fmt = '%Y-%m-%dT%H:%M:%S'
     time_idx = (
         pd.DatetimeIndex([
@@ -126,7 +159,6 @@ def time_range(dt, ticker, session='allday', tz='UTC', **kwargs) -> intervals.Se
             f'{cur_dt} {ss.end_time}'],
         )
         .tz_localize(ex_info.tz)
-        .tz_convert(DEFAULT_TZ)
         .tz_convert(tz)
     )
     if time_idx[0] > time_idx[1]: time_idx -= pd.TimedeltaIndex(['1D', '0D'])
@@ -293,23 +325,32 @@ def earning_pct(data: pd.DataFrame, yr):
 
     # Calculate level 2 percentage (higher levels will be ignored)
     sub_pct = []
-    for r, snap in data.reset_index()[::-1].iterrows():
-        if snap.level > 2: continue
-        if snap.level == 1:
+    levels = data.level.tolist()
+    for r in reversed(range(len(levels))):
+        if levels[r] > 2: continue
+        if levels[r] == 1:
             if len(sub_pct) == 0: continue
             data.iloc[sub_pct, data.columns.get_loc(pct)] = \
                 100 * data[yr].iloc[sub_pct] / data[yr].iloc[sub_pct].sum()
             sub_pct = []
-        if snap.level == 2: sub_pct.append(r)
+        if levels[r] == 2: sub_pct.append(r)
 
 
 def check_current(dt, logger, **kwargs) -> bool:
     """
     Check current time against T-1
     """
-    t_1 = pd.Timestamp('today').date() - pd.Timedelta('1D')
+    t_1 = _t_1_(today=time.localtime()[:3])
     whole_day = pd.Timestamp(dt).date() < t_1
     if (not whole_day) and kwargs.get('batch', False):
         logger.warning(f'Querying date {t_1} is too close, ignoring download ...')
         return False
     return True
+
+
+@lru_cache(maxsize=1)
+def _t_1_(today: tuple):
+    """
+    T-1 date - cached for the day given by (year, month, day)
+    """
+    return pd.Timestamp(*today).date() - ONE_DAY
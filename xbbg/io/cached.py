@@ -1,52 +1,230 @@
 import pandas as pd
+import numpy as np
 
+import os
+
+from functools import partial
 from itertools import product
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from xbbg.core import utils
-from xbbg.io import files, logs, storage
+from xbbg.core import utils, trials
+from xbbg.io import files, logs, storage, db
 
 ToQuery = namedtuple('ToQuery', ['tickers', 'flds', 'cached_data'])
 EXC_COLS = ['tickers', 'flds', 'raw', 'log', 'col_maps']
 
+FUT_TABLE = """
+    CREATE TABLE IF NOT EXISTS fut_ticker (
+        gen_ticker varchar(30),
+        dt varchar(10),
+        freq varchar(10),
+        same_month int,
+        ticker varchar(30),
+        PRIMARY KEY (gen_ticker, dt, freq, same_month)
+    )
+"""
+_FUT_MEMO_ = OrderedDict()
+_FUT_MEMO_SIZE_ = 4096
+_POOL_MIN_FILES_ = 8
+
 
-def bdp_bds_cache(func, tickers, flds, **kwargs) -> ToQuery:
+def bdp_bds_cache(tickers, flds, **kwargs) -> ToQuery:
     """
     Find cached `BDP` / `BDS` queries
 
     Args:
-        func: function name - bdp or bds
         tickers: tickers
         flds: fields
         **kwargs: other kwargs
 
     Returns:
         ToQuery(ticker, flds, kwargs)
+
+    Examples:
+        >>> import os, shutil, tempfile
+        >>> bbg_root = os.environ.get('BBG_ROOT', '')
+        >>> os.environ['BBG_ROOT'] = tempfile.mkdtemp()
+        >>> sample = pd.DataFrame(
+        ...     [['AAPL US Equity', 'Crncy', 'USD']], columns=['ticker', 'field', 'value']
+        ... )
+        >>> data_file = storage.ref_file(
+        ...     'AAPL US Equity', fld='Crncy', has_date=True, cache=True, ext='pkl'
+        ... )
+        >>> files.create_folder(data_file, is_file=True)
+        >>> sample.to_pickle(data_file)
+        >>> to_qry = bdp_bds_cache('AAPL US Equity', ['Crncy', 'Name'])
+        >>> to_qry.tickers, to_qry.flds, len(to_qry.cached_data)
+        (['AAPL US Equity'], ['Name'], 1)
+        >>> to_qry = bdp_bds_cache('AAPL US Equity', 'Crncy')
+        >>> to_qry.tickers, to_qry.flds, len(to_qry.cached_data)
+        ([], [], 1)
+        >>> shutil.rmtree(os.environ['BBG_ROOT'])
+        >>> os.environ['BBG_ROOT'] = bbg_root
     """
-    cache_data = []
+    hit_files = []
     logger = logs.get_logger(bdp_bds_cache, **kwargs)
-    kwargs['has_date'] = kwargs.pop('has_date', func == 'bds')
+    kwargs['has_date'] = kwargs.pop('has_date', True)
     kwargs['cache'] = kwargs.get('cache', True)
 
     tickers = utils.flatten(tickers)
     flds = utils.flatten(flds)
-    loaded = pd.DataFrame(data=0, index=tickers, columns=flds)
-
-    for ticker, fld in product(tickers, flds):
-        data_file = storage.ref_file(
-            ticker=ticker, fld=fld, ext='pkl', **{
-                k: v for k, v in kwargs.items() if k not in EXC_COLS
-            }
-        )
-        if not files.exists(data_file): continue
+    if not (tickers and flds): return ToQuery(tickers=[], flds=[], cached_data=[])
+
+    loaded = np.zeros((len(tickers), len(flds)), dtype=np.uint8)
+    ref_file = partial(storage.ref_file, ext='pkl', **{
+        k: v for k, v in kwargs.items() if k not in EXC_COLS
+    })
+
+    for (r, ticker), (c, fld) in product(enumerate(tickers), enumerate(flds)):
+        data_file = ref_file(ticker=ticker, fld=fld)
+        if not os.path.isfile(data_file): continue
         logger.debug(f'reading from {data_file} ...')
-        cache_data.append(pd.read_pickle(data_file))
-        loaded.loc[ticker, fld] = 1
+        hit_files.append(data_file)
+        loaded[r, c] = 1
 
-    to_qry = loaded.where(loaded == 0)\
-        .dropna(how='all', axis=1).dropna(how='all', axis=0)
+    if not hit_files: return ToQuery(tickers=tickers, flds=flds, cached_data=[])
+    if len(hit_files) < _POOL_MIN_FILES_:
+        cache_data = list(map(pd.read_pickle, hit_files))
+    else:
+        with ThreadPoolExecutor(max_workers=min(32, len(hit_files))) as pool:
+            cache_data = list(pool.map(pd.read_pickle, hit_files))
+
+    missing = loaded == 0
+    miss_rows = np.flatnonzero(missing.any(axis=1))
+    miss_cols = np.flatnonzero(missing[miss_rows].any(axis=0))
 
     return ToQuery(
-        tickers=to_qry.index.tolist(), flds=to_qry.columns.tolist(),
+        tickers=[tickers[r] for r in miss_rows],
+        flds=[flds[c] for c in miss_cols],
         cached_data=cache_data
     )
+
+
+def update_bdp_bds_cache(data: pd.DataFrame, **kwargs):
+    """
+    Save raw `BDP` / `BDS` query results for each ticker and field
+
+    Args:
+        data: raw query results with `ticker` and `field` columns
+        **kwargs: other kwargs
+
+    Examples:
+        >>> import os, shutil, tempfile
+        >>> bbg_root = os.environ.get('BBG_ROOT', '')
+        >>> os.environ['BBG_ROOT'] = tempfile.mkdtemp()
+        >>> sample = pd.DataFrame(
+        ...     [['AAPL US Equity', 'Name', 'APPLE INC']], columns=['ticker', 'field', 'value']
+        ... )
+        >>> update_bdp_bds_cache(sample)
+        >>> to_qry = bdp_bds_cache('AAPL US Equity', 'Name')
+        >>> to_qry.tickers, to_qry.flds
+        ([], [])
+        >>> to_qry.cached_data[0].value.tolist()
+        ['APPLE INC']
+        >>> shutil.rmtree(os.environ['BBG_ROOT'])
+        >>> os.environ['BBG_ROOT'] = bbg_root
+    """
+    if data.empty or any(col not in data for col in ['ticker', 'field']): return
+    logger = logs.get_logger(update_bdp_bds_cache, **kwargs)
+    kwargs['has_date'] = kwargs.pop('has_date', True)
+    kwargs['cache'] = kwargs.get('cache', True)
+    ref_file = partial(storage.ref_file, ext='pkl', **{
+        k: v for k, v in kwargs.items() if k not in EXC_COLS
+    })
+
+    for (ticker, fld), snap in data.groupby(['ticker', 'field'], sort=False):
+        data_file = ref_file(ticker=ticker, fld=fld)
+        if not data_file: continue
+        logger.debug(f'saving to {data_file} ...')
+        files.create_folder(data_file, is_file=True)
+        snap.reset_index(drop=True).to_pickle(data_file)
+
+
+def fut_ticker_cache(gen_ticker: str, dt, freq: str, same_month: bool) -> str:
+    """
+    Futures ticker resolved by previous queries
+
+    Args:
+        gen_ticker: generic ticker
+        dt: date
+        freq: futures contract frequency
+        same_month: whether `dt` is in current month (1-digit year in ticker)
+
+    Returns:
+        str: exact futures ticker - empty if not cached
+
+    Examples:
+        >>> import os, shutil, tempfile
+        >>> bbg_root = os.environ.get('BBG_ROOT', '')
+        >>> os.environ['BBG_ROOT'] = tempfile.mkdtemp()
+        >>> fut_kw = dict(gen_ticker='ES1 Index', freq='Q', same_month=False)
+        >>> update_fut_ticker('ESZ18 Index', dt='2018-11-02', **fut_kw)
+        >>> _FUT_MEMO_.clear()
+        >>> fut_ticker_cache(dt='2018-11-02', **fut_kw)
+        'ESZ18 Index'
+        >>> fut_ticker_cache(dt='2018-11-02', gen_ticker='ES1 Index', freq='Q', same_month=True)
+        ''
+        >>> _FUT_MEMO_.clear()
+        >>> shutil.rmtree(os.environ['BBG_ROOT'])
+        >>> os.environ['BBG_ROOT'] = bbg_root
+    """
+    fut_info = dict(
+        gen_ticker=gen_ticker, dt=utils.fmt_dt(dt), freq=freq, same_month=int(same_month)
+    )
+    key = tuple(fut_info.values())
+    if key in _FUT_MEMO_: return _FUT_MEMO_[key]
+
+    data_path = trials.root_path()
+    if not data_path: return ''
+
+    db_file = f'{data_path}/Logs/xbbg.db'
+    files.create_folder(db_file, is_file=True)
+    with db.SQLite(db_file) as con:
+        con.execute(FUT_TABLE)
+        res = con.execute(db.select(table='fut_ticker', **fut_info)).fetchall()
+    if not res: return ''
+
+    _memo_fut_(key=key, ticker=res[0][-1])
+    return res[0][-1]
+
+
+def update_fut_ticker(ticker: str, gen_ticker: str, dt, freq: str, same_month: bool):
+    """
+    Save resolved futures ticker for later queries
+
+    Args:
+        ticker: exact futures ticker
+        gen_ticker: generic ticker
+        dt: date
+        freq: futures contract frequency
+        same_month: whether `dt` is in current month (1-digit year in ticker)
+    """
+    if not ticker: return
+    fut_info = dict(
+        gen_ticker=gen_ticker, dt=utils.fmt_dt(dt), freq=freq, same_month=int(same_month)
+    )
+    _memo_fut_(key=tuple(fut_info.values()), ticker=ticker)
+
+    data_path = trials.root_path()
+    if not data_path: return
+
+    db_file = f'{data_path}/Logs/xbbg.db'
+    files.create_folder(db_file, is_file=True)
+    with db.SQLite(db_file) as con:
+        con.execute(FUT_TABLE)
+        con.execute(db.replace_into(table='fut_ticker', ticker=ticker, **fut_info))
+
+
+def _memo_fut_(key: tuple, ticker: str):
+    """
+    Keep resolved futures ticker in memory - oldest entries evicted first
+
+    Examples:
+        >>> _memo_fut_(key=('ES1 Index', '2018-11-02', 'Q', 0), ticker='ESZ18 Index')
+        >>> _FUT_MEMO_.popitem()
+        (('ES1 Index', '2018-11-02', 'Q', 0), 'ESZ18 Index')
+    """
+    _FUT_MEMO_[key] = ticker
+    _FUT_MEMO_.move_to_end(key)
+    while len(_FUT_MEMO_) > _FUT_MEMO_SIZE_: _FUT_MEMO_.popitem(last=False)
@@ -4,7 +4,7 @@ import os
 import re
 import time
 
-from typing import List
+from typing import List, Set
 from pathlib import Path
 
 DATE_FMT = r'\d{4}-(0?[1-9]|1[012])-(0?[1-9]|[12][0-9]|3[01])'
@@ -21,6 +21,23 @@ def exists(path) -> bool:
     return Path(path).is_dir() or Path(path).is_file()
 
 
+def file_names(path_name) -> Set[str]:
+    """
+    Names of all files in folder with a single directory scan
+
+    Args:
+        path_name: full path name
+
+    Returns:
+        set: file names (empty if folder does not exist)
+    """
+    if not path_name: return set()
+    try:
+        with os.scandir(path_name) as entries:
+            return {f.name for f in entries if f.is_file()}
+    except OSError: return set()
+
+
 def abspath(cur_file, parent=0) -> Path:
     """
     Absolute path
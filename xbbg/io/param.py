@@ -29,6 +29,19 @@ def config_files(cat: str) -> list:
     ]
 
 
+def config_stamp(cat: str) -> tuple:
+    """
+    Category files with their modified times
+
+    Args:
+        cat: category
+
+    Returns:
+        tuple: (file, modified time) pairs - changes with BBG_ROOT or file edits
+    """
+    return tuple((f, os.path.getmtime(f)) for f in config_files(cat=cat))
+
+
 def load_config(cat: str) -> pd.DataFrame:
     """
     Load market info that can apply pd.Series directly
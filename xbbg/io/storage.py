@@ -120,13 +120,14 @@ def ref_file(
 
     # Check date info
     if has_date:
-        cache_file = f'{root}/asof=[cur_date], {info}.{ext}'
+        cache_file = f'asof=[cur_date], {info}.{ext}'
         cur_dt = utils.cur_time()
         start_dt = pd.date_range(end=cur_dt, freq=f'{cache_days}D', periods=2)[0]
+        cached = files.file_names(root)
         for dt in pd.date_range(start=start_dt, end=cur_dt, normalize=True)[1:][::-1]:
             cur_file = cache_file.replace('[cur_date]', dt.strftime("%Y-%m-%d"))
-            if files.exists(cur_file): return cur_file
-        return cache_file.replace('[cur_date]', cur_dt)
+            if cur_file in cached: return f'{root}/{cur_file}'
+        return f'{root}/' + cache_file.replace('[cur_date]', cur_dt)
 
     return f'{root}/{info}.{ext}'
 
@@ -177,4 +178,4 @@ def save_intraday(data: pd.DataFrame, ticker: str, dt, typ='TRADE', **kwargs):
 
     logger.info(f'saving data to {data_file} ...')
     files.create_folder(data_file, is_file=True)
-    data.to_parquet(data_file)
+    data.to_parquet(data_file, compression='zstd', compression_level=3)